@@ -1,56 +1,196 @@
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
-from dash import Dash, dcc, html, Input, Output, State
+import numexpr as ne
+import os
+import glob
+import io
+import orjson
+import hashlib
+import math
+import hdbscan
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction
 from dash.dash_table import DataTable
 import plotly.express as px
+import plotly.io as pio
 import base64
-from fpdf import FPDF
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter, landscape
+from flask import request, send_file, abort
+from flask_caching import Cache
+from urllib.parse import urlencode
 import webbrowser
 
 # 1. LOAD DATA
-df = pd.read_csv("nyc_taxi_with_coords.csv")
-
-# Drop missing crucial info
-df = df.dropna(subset=["pickup_longitude", "pickup_latitude", "pickup_borough", "tpep_pickup_datetime"])
-df["pickup_longitude"] = df["pickup_longitude"].astype(float)
-df["pickup_latitude"] = df["pickup_latitude"].astype(float)
-df["tpep_pickup_datetime"] = pd.to_datetime(df["tpep_pickup_datetime"])
-df["hour"] = df["tpep_pickup_datetime"].dt.hour
+CSV_PATH = "nyc_taxi_with_coords.csv"
+# Only the columns the dashboard reads; the rest of the file is never loaded
+USE_COLS = ["pickup_longitude", "pickup_latitude", "pickup_borough", "pickup_zone",
+            "tpep_pickup_datetime", "trip_distance", "total_amount"]
+DTYPES = {
+    "pickup_longitude": np.float32,
+    "pickup_latitude": np.float32,
+    "trip_distance": np.float32,
+    "total_amount": np.float32,
+    "pickup_borough": "category",
+    "pickup_zone": "category"
+}
+# Bump when the cleanup steps below (dropna, hour derivation) change
+LOAD_VERSION = 1
+
+# Remove cache files from earlier keys (and any half-written temp files)
+def clear_stale(pattern, keep):
+    for path in glob.glob(pattern):
+        if path != keep:
+            os.remove(path)
+
+# Typed Parquet copy is written on first run so later starts skip CSV parsing.
+# The file name is keyed on the CSV's mtime/size and the load spec, so any change
+# to either writes a fresh cache instead of silently reusing a stale one.
+csv_stat = os.stat(CSV_PATH)
+load_key = hashlib.md5(repr((
+    csv_stat.st_mtime_ns, csv_stat.st_size, USE_COLS, sorted((k, str(v)) for k, v in DTYPES.items()), LOAD_VERSION
+)).encode()).hexdigest()[:12]
+PARQUET_CACHE = f"nyc_taxi_{load_key}.parquet"
+clear_stale("nyc_taxi_*.parquet", keep=PARQUET_CACHE)
+if os.path.exists(PARQUET_CACHE):
+    df = pd.read_parquet(PARQUET_CACHE)
+else:
+    df = pd.read_csv(
+        CSV_PATH,
+        engine="pyarrow",
+        usecols=USE_COLS,
+        parse_dates=["tpep_pickup_datetime"],
+        dtype=DTYPES
+    )
 
-# Optional: limit rows for performance
+    # Drop missing crucial info
+    df = df.dropna(subset=["pickup_longitude", "pickup_latitude", "pickup_borough", "tpep_pickup_datetime"])
+    df["hour"] = df["tpep_pickup_datetime"].dt.hour.astype(np.int8)
+    # Write to a temp file and rename, so an interrupted write never leaves a
+    # truncated file at the keyed path
+    tmp = f"nyc_taxi_{load_key}.tmp.parquet"
+    df.to_parquet(tmp, compression="zstd")
+    os.replace(tmp, PARQUET_CACHE)
+
+# Optional: limit rows for performance. Each (borough, hour) cell keeps
+# max(1, int(len*frac)) rows, so cells shrink roughly in proportion and even
+# the smallest ones stay in the filters
 MAX_ROWS = 150000
 if len(df) > MAX_ROWS:
-    df = df.sample(MAX_ROWS, random_state=42)
-
-# 2. DBSCAN HOTSPOTS
-coords = np.radians(df[["pickup_latitude","pickup_longitude"]])
-dbscan = DBSCAN(eps=0.003, min_samples=100, metric="haversine", algorithm="ball_tree")
-df["cluster"] = dbscan.fit_predict(coords).astype(str)
+    frac = MAX_ROWS/len(df)
+    shuffled = df.sample(frac=1, random_state=42)
+    cells = shuffled.groupby(["pickup_borough","hour"], observed=True)
+    quota = np.maximum(1, (cells["hour"].transform("size")*frac).astype(int))
+    df = shuffled[cells.cumcount() < quota]
+
+# 2. HDBSCAN HOTSPOTS
+# Unit-sphere xyz: chord distance is monotonic with haversine, so a kd-tree on
+# euclidean xyz finds the same neighbourhoods without trig in the distance kernel.
+# Each component is one fused numexpr pass instead of a chain of numpy temporaries.
+lat = df["pickup_latitude"].to_numpy(np.float32)
+lon = df["pickup_longitude"].to_numpy(np.float32)
+R = np.float32(np.pi/180)
+xyz = np.stack([
+    ne.evaluate("cos(lat*R)*cos(lon*R)"),
+    ne.evaluate("cos(lat*R)*sin(lon*R)"),
+    ne.evaluate("sin(lat*R)")
+], axis=1)
+CLUSTER_PARAMS = dict(min_cluster_size=100, algorithm="boruvka_kdtree")
+
+# Labels are cached on disk keyed by the input points and parameters, so
+# restarts (including debug reloads) skip reclustering
+key = hashlib.md5(np.ascontiguousarray(xyz).tobytes() + repr(sorted(CLUSTER_PARAMS.items())).encode()).hexdigest()[:12]
+label_cache = f"labels_{key}.npy"
+clear_stale("labels_*.npy", keep=label_cache)
+if os.path.exists(label_cache):
+    labels = np.load(label_cache)
+else:
+    clusterer = hdbscan.HDBSCAN(**CLUSTER_PARAMS, core_dist_n_jobs=-1)
+    labels = clusterer.fit_predict(xyz).astype(np.int16)
+    # Same temp-file + rename as the Parquet cache
+    tmp = f"labels_{key}.tmp.npy"
+    np.save(tmp, labels)
+    os.replace(tmp, label_cache)
+df["cluster"] = pd.Series(labels, index=df.index).astype("category")
+
+
+# 3. PRECOMPUTED AGGREGATES
+# Sort by hour once so each hour is a contiguous slice instead of a boolean mask
+df = df.sort_values("hour", kind="stable").reset_index(drop=True)
+HOUR_IDX = np.searchsorted(df["hour"].to_numpy(), np.arange(25))
+
+# Top zone via bincount over category codes rather than a per-subset mode()
+ZONE_CATS = df["pickup_zone"].cat.categories
+
+def top_zone(sub):
+    codes = sub["pickup_zone"].cat.codes.to_numpy()
+    codes = codes[codes >= 0]
+    if not len(codes):
+        return "N/A"
+    return ZONE_CATS[np.bincount(codes, minlength=len(ZONE_CATS)).argmax()]
+
+# One entry per (hour, borough) filter state; borough None means all boroughs
+PRECOMP = {}
+for h in df["hour"].unique():
+    sub_h = df.iloc[HOUR_IDX[h]:HOUR_IDX[h+1]]
+    for b in [None] + list(sub_h["pickup_borough"].unique()):
+        sub = sub_h if b is None else sub_h[sub_h["pickup_borough"]==b]
+        PRECOMP[(h, b)] = dict(
+            view=sub,
+            n=len(sub),
+            nclust=sub["cluster"].nunique(),
+            avg_d=sub["trip_distance"].mean(),
+            avg_f=sub["total_amount"].mean(),
+            top=top_zone(sub),
+            bar=sub.groupby("cluster", observed=True).size().reset_index(name="trip_count"),
+            line=sub.groupby("hour", observed=True).size().reset_index(name="trips_per_hour")
+        )
 
 
-# 3. DASH APP
-app = Dash(__name__)
+# Precomputed entry for a filter state; every callback and route reads through this
+def selection(hour, borough):
+    return PRECOMP.get((hour, borough or None))
+
+
+# KPI scalars shipped to the browser once; keyed "hour|borough" ("" = all boroughs).
+# All-NaN averages are sent as null and shown as "0" by the clientside callback.
+KPI_STORE = {
+    f"{int(h)}|{b or ''}": {
+        "n": pre["n"],
+        "nclust": int(pre["nclust"]),
+        "avg_d": None if pd.isna(pre["avg_d"]) else float(pre["avg_d"]),
+        "avg_f": None if pd.isna(pre["avg_f"]) else float(pre["avg_f"]),
+        "top": str(pre["top"])
+    }
+    for (h, b), pre in PRECOMP.items()
+}
+
+# Above this many rows the map plots grid bins instead of individual trips
+MAP_AGG_MIN_ROWS = 5000
+# Cell size (degrees) for the density layer
+DENSITY_GRID = 0.002
+# Rows per Data tab page
+PAGE_SIZE = 20
+# Line height (pt) for the PDF export
+PDF_LEADING = 9
+
+
+# 4. DASH APP
+# The data table is created inside the tab content, so its callback targets
+# an id that is not in the initial layout
+app = Dash(__name__, suppress_callback_exceptions=True)
 app.title = "NYC Taxi Interactive Dashboard"
-
-
-# KPI CARD HELPER
-def kpi_card(title, value):
-    return html.Div(
-        style={
-            "backgroundColor":"#1e293b",
-            "padding":"20px",
-            "borderRadius":"12px",
-            "width":"220px",
-            "textAlign":"center",
-            "color":"white",
-            "boxShadow":"2px 2px 8px #00000050"
-        },
-        children=[html.H4(title), html.H2(str(value))]
-    )
-
-
-# 4. LAYOUT
+# Room for every filter state of each memoized builder (_map_figure,
+# _chart_figures, _pdf_b64) plus flask_caching's per-function version keys, so
+# SimpleCache never hits its threshold and evicts entries
+MEMOIZED_BUILDERS = 3
+cache = Cache(app.server, config={
+    "CACHE_TYPE":"SimpleCache",
+    "CACHE_DEFAULT_TIMEOUT":0,
+    "CACHE_THRESHOLD":MEMOIZED_BUILDERS*(len(PRECOMP) + 1)
+})
+
+
+# 5. LAYOUT
 app.layout = html.Div(
     style={"backgroundColor":"#0f172a","color":"white","minHeight":"100vh","padding":"20px","fontFamily":"Arial"},
     children=[
@@ -89,7 +229,8 @@ app.layout = html.Div(
 
         html.Hr(style={"borderColor":"#334155"}),
 
-        # KPI Cards
+        # KPI Cards (filled client-side from kpi-store)
+        dcc.Store(id="kpi-store", data=KPI_STORE),
         html.Div(id="kpi-cards", style={"display":"flex","gap":"20px","flexWrap":"wrap","justifyContent":"center"}),
 
         html.Hr(style={"borderColor":"#334155"}),
@@ -105,24 +246,110 @@ app.layout = html.Div(
 )
 
 
-# 5. CALLBACKS
-@app.callback(
+# 6. CALLBACKS
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="update_kpis"),
     Output("kpi-cards","children"),
     Input("hour-filter","value"),
-    Input("borough-filter","value")
+    Input("borough-filter","value"),
+    State("kpi-store","data")
 )
-def update_kpis(hour, borough):
-    temp = df[df["hour"]==hour]
-    if borough:
-        temp = temp[temp["pickup_borough"]==borough]
-    top_zone = temp["pickup_zone"].mode()[0] if not temp.empty else "N/A"
-    return [
-        kpi_card("Total Trips", len(temp)),
-        kpi_card("Clusters", temp["cluster"].nunique()),
-        kpi_card("Avg Distance", f"{temp['trip_distance'].mean():.2f} mi" if not temp.empty else "0"),
-        kpi_card("Avg Fare", f"${temp['total_amount'].mean():.2f}" if not temp.empty else "0"),
-        kpi_card("Top Zone", top_zone)
-    ]
+
+# Memoized builders: (tab, hour, borough) has only a few hundred states, so each
+# figure / export is built once and later clicks return the cached result.
+# Figures are cached as JSON strings so plotly's serialization also runs once.
+@cache.memoize()
+def _map_figure(hour, borough):
+    temp = selection(hour, borough)["view"]
+    if len(temp) < MAP_AGG_MIN_ROWS:
+        pts = temp.rename(columns={"pickup_latitude":"la", "pickup_longitude":"lo"})
+        size = None
+        hover = ["pickup_zone","trip_distance","total_amount"]
+    else:
+        # ~100 m grid bins, one marker per (bin, cluster)
+        pts = (
+            temp.assign(la=temp["pickup_latitude"].round(3), lo=temp["pickup_longitude"].round(3))
+            .groupby(["la","lo","cluster"], observed=True)
+            .agg(n=("trip_distance","size"), d=("trip_distance","mean"), f=("total_amount","mean"))
+            .reset_index()
+        )
+        size = "n"
+        hover = {"n":True, "d":":.2f", "f":":.2f"}
+    pts = pts.assign(cluster_str=pts["cluster"].astype(str))
+    fig_map = px.scatter_map(
+        pts,
+        lat="la",
+        lon="lo",
+        size=size,
+        color="cluster_str",
+        labels={"cluster_str":"cluster", "la":"pickup_latitude", "lo":"pickup_longitude",
+                "n":"trips", "d":"avg trip_distance", "f":"avg total_amount"},
+        zoom=10,
+        height=600,
+        hover_data=hover,
+        color_discrete_sequence=px.colors.qualitative.Bold
+    )
+    # Density layer: trips snapped to a 0.002 degree grid with their trip
+    # distances summed per cell. The kernel adds up z weights, so summing keeps
+    # each cell's total weight and only moves points to the cell centre.
+    dens = (
+        temp.assign(la=(temp["pickup_latitude"]/DENSITY_GRID).round()*DENSITY_GRID,
+                    lo=(temp["pickup_longitude"]/DENSITY_GRID).round()*DENSITY_GRID)
+        .groupby(["la","lo"], observed=True)["trip_distance"].sum()
+        .reset_index()
+    )
+    fig_map.add_density_mapbox(
+        lat=dens["la"],
+        lon=dens["lo"],
+        z=dens["trip_distance"],
+        radius=15,
+        colorscale="Viridis",
+        opacity=0.4,
+        name="Hotspots"
+    )
+    fig_map.update_layout(
+        mapbox_style="open-street-map",
+        paper_bgcolor="#0f172a",
+        plot_bgcolor="#0f172a",
+        font_color="white",
+        margin={"r":0,"t":0,"l":0,"b":0}
+    )
+    return pio.to_json(fig_map)
+
+@cache.memoize()
+def _chart_figures(hour, borough):
+    pre = selection(hour, borough)
+    bar_data = pre["bar"]
+    line_data = pre["line"]
+
+    fig_bar = px.bar(bar_data, x="cluster", y="trip_count", color="trip_count", title="Trips per Cluster")
+    fig_bar.update_layout(paper_bgcolor="#0f172a", plot_bgcolor="#0f172a", font_color="white")
+
+    fig_line = px.line(line_data, x="hour", y="trips_per_hour", markers=True, title="Trips per Hour")
+    fig_line.update_layout(paper_bgcolor="#0f172a", plot_bgcolor="#0f172a", font_color="white")
+
+    return pio.to_json(fig_bar), pio.to_json(fig_line)
+
+@cache.memoize()
+def _pdf_b64(hour, borough):
+    temp = selection(hour, borough)["view"]
+    header, *rows = temp.head(100).to_string(index=False).splitlines()
+    # One text object per page instead of a multi_cell layout pass per row;
+    # the column header is repeated at the top of every page
+    buf = io.BytesIO()
+    width, height = landscape(letter)
+    c = canvas.Canvas(buf, pagesize=(width, height))
+    per_page = int((height - 80) // PDF_LEADING) - 1
+    for i in range(0, len(rows), per_page):
+        t = c.beginText(40, height - 40)
+        t.setFont("Courier", 7, leading=PDF_LEADING)
+        t.textLines([header] + rows[i:i+per_page])
+        c.drawText(t)
+        c.showPage()
+    c.save()
+    pdf_bytes = buf.getvalue()
+    return base64.b64encode(pdf_bytes).decode()
+
 
 @app.callback(
     Output("tabs-content","children"),
@@ -131,86 +358,84 @@ def update_kpis(hour, borough):
     Input("borough-filter","value")
 )
 def render_tab(tab, hour, borough):
-    temp = df[df["hour"]==hour]
-    if borough:
-        temp = temp[temp["pickup_borough"]==borough]
-
-    if temp.empty:
+    pre = selection(hour, borough)
+    if pre is None or pre["n"]==0:
         return html.Div("No data for this selection", style={"color":"red","textAlign":"center"})
+    temp = pre["view"]
 
     # MAP
     if tab=="map":
-        fig_map = px.scatter_map(
-            temp,
-            lat="pickup_latitude",
-            lon="pickup_longitude",
-            color="cluster",
-            zoom=10,
-            height=600,
-            hover_data=["pickup_zone","trip_distance","total_amount"],
-            color_discrete_sequence=px.colors.qualitative.Bold
-        )
-        fig_map.add_density_mapbox(
-            lat=temp["pickup_latitude"],
-            lon=temp["pickup_longitude"],
-            z=temp["trip_distance"],
-            radius=15,
-            colorscale="Viridis",
-            opacity=0.4,
-            name="Hotspots"
-        )
-        fig_map.update_layout(
-            mapbox_style="open-street-map",
-            paper_bgcolor="#0f172a",
-            plot_bgcolor="#0f172a",
-            font_color="white",
-            margin={"r":0,"t":0,"l":0,"b":0}
-        )
-        return dcc.Graph(figure=fig_map)
+        return dcc.Graph(figure=orjson.loads(_map_figure(hour, borough)))
 
     # CHARTS 
     elif tab=="charts":
-        bar_data = temp.groupby("cluster").size().reset_index(name="trip_count")
-        line_data = temp.groupby("hour").size().reset_index(name="trips_per_hour")
-
-        fig_bar = px.bar(bar_data, x="cluster", y="trip_count", color="trip_count", title="Trips per Cluster")
-        fig_bar.update_layout(paper_bgcolor="#0f172a", plot_bgcolor="#0f172a", font_color="white")
-
-        fig_line = px.line(line_data, x="hour", y="trips_per_hour", markers=True, title="Trips per Hour")
-        fig_line.update_layout(paper_bgcolor="#0f172a", plot_bgcolor="#0f172a", font_color="white")
-
-        return html.Div([dcc.Graph(figure=fig_bar), dcc.Graph(figure=fig_line)])
+        fig_bar, fig_line = _chart_figures(hour, borough)
+        return html.Div([dcc.Graph(figure=orjson.loads(fig_bar)), dcc.Graph(figure=orjson.loads(fig_line))])
 
     # DATA
     elif tab=="data":
+        # Rows are fetched a page at a time by page_table
         table = DataTable(
+            id="tbl",
             columns=[{"name":i,"id":i} for i in temp.columns],
-            data=temp.to_dict("records"),
-            page_size=20,
+            page_action="custom",
+            page_current=0,
+            page_size=PAGE_SIZE,
+            page_count=math.ceil(len(temp)/PAGE_SIZE),
             style_table={"overflowX":"auto"},
             style_cell={"color":"white","backgroundColor":"#0f172a"}
         )
 
         # CSV download
-        csv_string = temp.to_csv(index=False)
-        b64_csv = base64.b64encode(csv_string.encode()).decode()
-        download_csv = html.A("⬇ Download CSV", href="data:text/csv;base64,"+b64_csv,
+        download_csv = html.A("⬇ Download CSV", href=app.get_relative_path("/download/csv")+"?"+urlencode({"hour":hour, "borough":borough or ""}),
                               download="nyc_taxi_filtered.csv", style={"color":"#60a5fa"})
 
         # PDF download
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=10)
-        for i, row in temp.head(100).iterrows():
-            pdf.multi_cell(0, 6, txt=str(row.to_dict()))
-        pdf_bytes = pdf.output(dest='S').encode('latin1')
-        b64_pdf = base64.b64encode(pdf_bytes).decode()
-        download_pdf = html.A("⬇ Download PDF (first 100 rows)", href="data:application/pdf;base64,"+b64_pdf,
+        download_pdf = html.A("⬇ Download PDF (first 100 rows)", href="data:application/pdf;base64,"+_pdf_b64(hour, borough),
                               download="nyc_taxi_filtered.pdf", style={"color":"#60a5fa","marginLeft":"20px"})
 
         return html.Div([table, html.Br(), download_csv, download_pdf])
 
 
+@app.callback(
+    Output("tbl","data"),
+    Input("tbl","page_current"),
+    State("hour-filter","value"),
+    State("borough-filter","value")
+)
+def page_table(page_current, hour, borough):
+    pre = selection(hour, borough)
+    if pre is None:
+        return []
+    start = (page_current or 0)*PAGE_SIZE
+    return pre["view"].iloc[start:start+PAGE_SIZE].to_dict("records")
+
+
+# CSV served from a plain Flask route instead of a base64 data URL in the page.
+# Registered under Dash's routes prefix so it follows url_base_pathname; the
+# link is built with get_relative_path to match requests_pathname_prefix.
+@app.server.route(app.config.routes_pathname_prefix + "download/csv")
+def download_csv():
+    try:
+        hour = int(request.args["hour"])
+    except (KeyError, ValueError):
+        abort(400)
+    borough = request.args.get("borough") or None
+    pre = selection(hour, borough)
+    if pre is None:
+        abort(404)
+    # Gzip the body for clients that accept it; the browser decompresses on the fly
+    gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+    buf = io.BytesIO()
+    pre["view"].to_csv(buf, index=False, compression="gzip" if gzipped else None)
+    buf.seek(0)
+    resp = send_file(buf, mimetype="text/csv", as_attachment=True, download_name="nyc_taxi_filtered.csv")
+    if gzipped:
+        resp.headers["Content-Encoding"] = "gzip"
+        resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
 # RUN SERVER
 if __name__=="__main__":
     app.run(debug=True)
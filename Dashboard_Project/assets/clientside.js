@@ -0,0 +1,43 @@
+// Client-side callbacks: KPI cards are looked up in the browser from
+// kpi-store, so filter changes never round-trip to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    clientside: {
+        update_kpis: function(hour, borough, store) {
+            var pre = store[hour + "|" + (borough || "")];
+            if (!pre) {
+                pre = {n: 0, nclust: 0, avg_d: null, avg_f: null, top: "N/A"};
+            }
+            return [
+                kpiCard("Total Trips", pre.n),
+                kpiCard("Clusters", pre.nclust),
+                kpiCard("Avg Distance", pre.avg_d == null ? "0" : pre.avg_d.toFixed(2) + " mi"),
+                kpiCard("Avg Fare", pre.avg_f == null ? "0" : "$" + pre.avg_f.toFixed(2)),
+                kpiCard("Top Zone", pre.top)
+            ];
+        }
+    }
+});
+
+// KPI card markup and styling; the cards are only rendered client-side, so
+// this is the single definition (app.py no longer builds them)
+function kpiCard(title, value) {
+    return {
+        namespace: "dash_html_components",
+        type: "Div",
+        props: {
+            style: {
+                backgroundColor: "#1e293b",
+                padding: "20px",
+                borderRadius: "12px",
+                width: "220px",
+                textAlign: "center",
+                color: "white",
+                boxShadow: "2px 2px 8px #00000050"
+            },
+            children: [
+                {namespace: "dash_html_components", type: "H4", props: {children: title}},
+                {namespace: "dash_html_components", type: "H2", props: {children: String(value)}}
+            ]
+        }
+    };
+}